@@ -3,12 +3,22 @@ import ollama
 import os
 from rag_utils import multi_stage_retrieval, add_pdf_to_vector_db, init_vector_db, clear_vector_db
 
+# 生成回答用的大模型：显式指定4-bit量化（Q4_K_M）版本，避免拉取到FP16版本
+LLM_MODEL = "deepseek-r1:1.5b-qwen-distill-q4_K_M"
+
 # 设置页面标题和图标
 st.set_page_config(page_title="学术科研智能助手", page_icon="📚")
 
-# 初始化向量数据库（确保应用启动时就完成）
-if "vector_db" not in st.session_state:
-    st.session_state.vector_db = init_vector_db()
+# 向量数据库（Chroma客户端+嵌入模型）在所有会话和页面重跑之间共享，只在进程内初始化一次
+@st.cache_resource
+def load_vector_db():
+    return init_vector_db()
+
+
+# 初始化向量数据库（确保应用启动时就完成；清空向量库会重建集合，所以每次重跑都从缓存取当前集合）
+vector_db = load_vector_db()
+if "vector_db_ready" not in st.session_state:
+    st.session_state.vector_db_ready = True
     st.success("向量数据库初始化成功！")
 
 # 页面标题和欢迎语
@@ -42,21 +52,13 @@ with st.sidebar:
         # 点击按钮入库
         if st.button("📥 上传并入库"):
             with st.spinner("正在解析文献并入库..."):
-                success, msg = add_pdf_to_vector_db(pdf_save_path, st.session_state.vector_db)
+                success, msg = add_pdf_to_vector_db(pdf_save_path, vector_db)
                 if success:
                     st.success(msg)
                     os.remove(pdf_save_path)  # 入库后删除临时文件
                 else:
                     st.error(msg)
 
-        # 显示向量库状态（原有功能，无修改）
-        st.divider()
-        st.info(f"向量库当前文献页数：{st.session_state.vector_db.count()}")
-
-        # （原有向量库状态显示，注意：这里之前有重复，已保留1个）
-        st.divider()
-        st.info(f"向量库当前文献页数：{st.session_state.vector_db.count()}")
-
     # -------------------------- 新增：清空向量库按钮 --------------------------
     # 清空功能逻辑
     st.divider()
@@ -65,17 +67,19 @@ with st.sidebar:
     if confirm_clear:
         if st.button("🗑️ 清空当前向量库", type="primary"):
             with st.spinner("正在清空向量库..."):
-                success, msg = clear_vector_db(st.session_state.vector_db)
+                success, msg = clear_vector_db(vector_db)
                 if success:
+                    load_vector_db.clear()  # 集合已重建，旧对象失效，所有会话改用新集合
+                    vector_db = load_vector_db()
                     st.success(msg)
                 else:
                     st.error(msg)
     else:
         st.info("请勾选确认框以启用清空功能")
 
-    # 显示向量库状态（移到侧边栏内部，缩进正确）
+    # 显示向量库状态（侧边栏只显示这一处：放在入库/清空之后，每次渲染只查询一次向量库）
     st.divider()
-    st.info(f"向量库当前文献页数：{st.session_state.vector_db.count()}")
+    st.info(f"向量库当前文本块数：{vector_db.count()}")
 
 # 当用户输入问题时，执行RAG流程（修改后完整代码）
 if user_input:
@@ -90,7 +94,7 @@ if user_input:
     with st.spinner("检索相关文献..."):
         relevant_docs = multi_stage_retrieval(  # 这里替换为新增的多轮检索函数
             user_input,
-            st.session_state.vector_db,
+            vector_db,
             top_k_coarse=10,
             top_k_final=3
         )
@@ -111,15 +115,19 @@ if user_input:
     用户问题：{user_input}
     """
 
-    # 5. 调用大模型生成回答（无修改）
-    with st.spinner("生成回答..."):
-        response = ollama.generate(
-            model="deepseek-r1:1.5b",
+    # 5. 调用大模型生成回答（流式输出：边生成边显示，首个token到达即可看到回答）
+    with st.chat_message("assistant"):
+        placeholder = st.empty()
+        assistant_msg = ""
+        stream = ollama.generate(
+            model=LLM_MODEL,
             prompt=prompt,
+            stream=True,
             options={"temperature": 0.1}
         )
-    assistant_msg = response["response"]
+        for chunk in stream:
+            assistant_msg += chunk["response"]
+            placeholder.markdown(assistant_msg)
 
-    # 6. 添加助手消息到历史并显示（无修改）
-    st.session_state.chat_history.append({"role": "assistant", "content": assistant_msg})
-    st.chat_message("assistant").write(assistant_msg)
\ No newline at end of file
+    # 6. 添加助手消息到历史（上面已流式显示）
+    st.session_state.chat_history.append({"role": "assistant", "content": assistant_msg})
\ No newline at end of file
@@ -1,73 +1,295 @@
 import os
+
+# 编码和精排都在CPU上运行：让OpenMP用满所有核心（必须在导入torch/onnxruntime之前设置才生效）
+CPU_THREADS = os.cpu_count() or 1
+os.environ.setdefault("OMP_NUM_THREADS", str(CPU_THREADS))
+
+import queue
+import sqlite3
+import threading
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
+import torch
+import onnxruntime
 import chromadb
-import ollama
-from chromadb.utils import embedding_functions
-from sentence_transformers import SentenceTransformer
-from PyPDF2 import PdfReader
+from chromadb import Documents, EmbeddingFunction, Embeddings
+from sentence_transformers import SentenceTransformer, CrossEncoder
+from transformers import AutoTokenizer
+import pymupdf
+import xxhash
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 from dotenv import load_dotenv
 
 # 加载环境变量（后续可存API密钥，现在为空也不影响）
 load_dotenv()
 
+# torch默认线程数常常偏少（池化等后处理仍走torch）；interop线程数只能在首次并行计算前设置一次
+torch.set_num_threads(CPU_THREADS)
+try:
+    torch.set_num_interop_threads(2)
+except RuntimeError:
+    pass  # Streamlit热重载本模块时已设置过
+
+
+def ort_session_options():
+    """ONNX Runtime会话配置：算子内并行线程数用满所有核心，并开启全部图优化（算子融合等，作用同torch.compile）"""
+    session_options = onnxruntime.SessionOptions()
+    session_options.intra_op_num_threads = CPU_THREADS
+    session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return session_options
+
 
 # -------------------------- 1. 初始化向量数据库和嵌入模型 --------------------------
-def init_vector_db():
-    chroma_client = chromadb.PersistentClient(path="./chroma_db")
-    # 使用Sentence-BERT嵌入模型
-    sentence_transformer_ef = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="all-MiniLM-L6-v2"  # 轻量高效的开源模型
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"  # 轻量高效的开源模型
+# 模型仓库自带的动态INT8量化ONNX文件（AVX2即可运行），比FP32编码快2-4倍、体积约为1/4
+EMBEDDING_ONNX_FILE = "onnx/model_quint8_avx2.onnx"
+EMBEDDING_BATCH_SIZE = 64  # 长文献整批编码时每次前向的文本数
+
+
+@lru_cache(maxsize=1)
+def get_embedding_model():
+    """加载INT8量化的Sentence-BERT嵌入模型（ONNX Runtime推理，首次调用时加载，之后复用）"""
+    return SentenceTransformer(
+        EMBEDDING_MODEL_NAME,
+        backend="onnx",
+        model_kwargs={"file_name": EMBEDDING_ONNX_FILE, "session_options": ort_session_options()}
     )
-    collection = chroma_client.get_or_create_collection(
-        name="academic_papers",
-        embedding_function=sentence_transformer_ef,
-        metadata={"description": "存储学术文献的向量数据库"}
+
+
+def embed_texts(texts):
+    """批量编码文本（encode内部先按长度排序再分批，同一批长度相近，减少padding浪费）。
+    直接返回float32向量数组的列表交给Chroma，不经过Python float列表（Chroma会再转成float64中间数组）"""
+    embeddings = get_embedding_model().encode(
+        list(texts),
+        batch_size=EMBEDDING_BATCH_SIZE,
+        convert_to_numpy=True,
+        show_progress_bar=False
     )
+    return list(embeddings)
+
+
+class QuantizedEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Chroma嵌入函数：用INT8量化模型批量编码文本"""
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return embed_texts(input)
+
+
+# HNSW索引参数：默认M=16、search_ef=10时库变大后召回率下降；这些参数只在集合创建时生效
+HNSW_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:M": 24,
+    "hnsw:construction_ef": 128,
+    "hnsw:search_ef": 100
+}
+COLLECTION_NAME = "academic_papers"
+
+
+CHROMA_DB_PATH = "./chroma_db"
+
+
+def enable_sqlite_wal(db_path):
+    """把Chroma的SQLite库切换为WAL日志模式：该模式写入数据库文件、对之后所有连接持久生效，批量入库时写入不再互相阻塞、fsync更少"""
+    os.makedirs(db_path, exist_ok=True)
+    try:
+        with closing(sqlite3.connect(os.path.join(db_path, "chroma.sqlite3"))) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+    except sqlite3.OperationalError:
+        pass  # 库正被其他进程占用时保持原模式，不影响使用
+
+
+def _create_collection(chroma_client):
+    return chroma_client.get_or_create_collection(
+        name=COLLECTION_NAME,
+        embedding_function=QuantizedEmbeddingFunction(),
+        metadata={"description": "存储学术文献的向量数据库", **HNSW_METADATA}
+    )
+
+
+def init_vector_db():
+    """初始化向量库；按旧HNSW参数建的空集合会直接按当前参数重建（有数据的集合需先清空）"""
+    enable_sqlite_wal(CHROMA_DB_PATH)
+    chroma_client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+    collection = _create_collection(chroma_client)
+    current_metadata = collection.metadata or {}
+    if collection.count() == 0 and any(current_metadata.get(k) != v for k, v in HNSW_METADATA.items()):
+        chroma_client.delete_collection(COLLECTION_NAME)
+        collection = _create_collection(chroma_client)
     return collection
 
 
 # -------------------------- 2. 解析PDF文献（提取文本和元数据） --------------------------
-def parse_pdf(pdf_file_path):
-    """解析PDF文件，提取标题、页码、文本内容（按页分割）"""
-    reader = PdfReader(pdf_file_path)
-    pdf_metadata = reader.metadata  # 获取PDF元数据（作者、标题等）
-    documents = []
+EMBEDDING_MAX_TOKENS = 256  # all-MiniLM-L6-v2的最大输入长度（含[CLS]和[SEP]），超出部分会被直接截断
 
-    # 按页提取文本，生成结构化文档
-    for page_num, page in enumerate(reader.pages, start=1):
-        page_text = page.extract_text()
-        if page_text:  # 跳过空白页
-            documents.append({
-                "text": page_text,
-                "metadata": {
-                    "file_name": os.path.basename(pdf_file_path),
-                    "page_num": page_num,
-                    "author": pdf_metadata.get("/Author", "未知"),
-                    "title": pdf_metadata.get("/Title", "未知标题")
+
+@lru_cache(maxsize=1)
+def get_text_splitter():
+    """按句子边界切块，长度用嵌入模型的分词器计算，保证每块都在MiniLM的输入窗口内（中英文都不会被截断）；首次调用时加载"""
+    # 单独加载一份分词器：解析线程切块时编码线程可能正在用模型自带的分词器，HF快速分词器不能被多线程同时使用
+    tokenizer = AutoTokenizer.from_pretrained(f"sentence-transformers/{EMBEDDING_MODEL_NAME}")
+    return RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+        tokenizer,
+        chunk_size=EMBEDDING_MAX_TOKENS - 2,  # 留出[CLS]和[SEP]
+        chunk_overlap=50,
+        separators=["\n\n", "\n", "。", ". ", " ", ""]
+    )
+
+
+def iter_pdf_chunks(pdf_file_path):
+    """逐页解析PDF文件，依次产出每页各文本块的文本和元数据（标题、页码、块序号等）；使用PyMuPDF（C实现），比纯Python的PyPDF2快5-10倍"""
+    with pymupdf.open(pdf_file_path) as pdf:
+        pdf_metadata = pdf.metadata or {}  # 获取PDF元数据（作者、标题等），缺失字段为空字符串
+        # 整篇文献共用的元数据只取一次，不在逐页/逐块循环里重复查找
+        file_name = os.path.basename(pdf_file_path)
+        author = pdf_metadata.get("author") or "未知"
+        title = pdf_metadata.get("title") or "未知标题"
+
+        # 按页提取文本，切成有重叠的文本块，生成结构化文档
+        for page_num, page in enumerate(pdf, start=1):
+            page_text = page.get_text("text")
+            if not page_text.strip():  # 跳过空白页
+                continue
+            for chunk_id, chunk in enumerate(get_text_splitter().split_text(page_text)):
+                yield {
+                    "id": make_doc_id(file_name, page_num, chunk_id),
+                    "text": chunk,
+                    "metadata": {
+                        "file_name": file_name,
+                        "page_num": page_num,
+                        "chunk_id": chunk_id,
+                        "text_hash": xxhash.xxh64(chunk.encode("utf-8")).hexdigest(),  # 用于入库去重
+                        "author": author,
+                        "title": title
+                    }
                 }
-            })
-    return documents
+
+
+def parse_pdf(pdf_file_path):
+    """解析PDF文件，提取标题、页码、文本内容（按页分割后再切成文本块）"""
+    return list(iter_pdf_chunks(pdf_file_path))
 
 
 # -------------------------- 3. 文献向量入库 --------------------------
+def make_doc_id(file_name, page_num, chunk_id):
+    """生成文本块的确定性ID（同名文献重新上传时，同一位置的文本块ID不变）"""
+    return f"{file_name}_p{page_num}_c{chunk_id}"
+
+
+# 每次交给编码的文本块数：取EMBEDDING_BATCH_SIZE的整数倍，保证encode每批都是满批，且能在更大范围内按长度排序
+PIPELINE_BATCH_SIZE = EMBEDDING_BATCH_SIZE * 2
+PIPELINE_QUEUE_SIZE = 16  # 解析与编码之间最多缓冲的批次数
+
+
+def _produce_chunk_batches(pdf_file_path, chunk_queue, stop_event):
+    """生产者：逐页解析PDF、切块并按批放入队列，结束时放入None作为结束标记"""
+    try:
+        batch = []
+        for doc in iter_pdf_chunks(pdf_file_path):
+            if stop_event.is_set():  # 编码端出错时提前结束
+                return
+            batch.append(doc)
+            if len(batch) == PIPELINE_BATCH_SIZE:
+                chunk_queue.put(batch)
+                batch = []
+        if batch:
+            chunk_queue.put(batch)
+    finally:
+        chunk_queue.put(None)
+
+
+def _drop_duplicate_chunks(batch, collection, seen_hashes, kept_ids):
+    """按文本哈希去重，返回需要编码写入的文本块。跳过的情况：
+    1. 其他文献中已有相同文本；2. 本文献同一ID下已存有相同文本（重复上传时未改动的部分，其ID记入kept_ids）；3. 本次上传中已出现过的文本。
+    本文献其他ID下的旧文本不算重复——它们属于旧版本，入库结束时会被删除"""
+    file_name = batch[0]["metadata"]["file_name"]
+    batch_hashes = list({doc["metadata"]["text_hash"] for doc in batch})
+    existing = collection.get(where={"text_hash": {"$in": batch_hashes}}, include=["metadatas"])
+    unchanged = set()
+    for doc_id, meta in zip(existing["ids"], existing["metadatas"]):
+        if meta["file_name"] == file_name:
+            unchanged.add((doc_id, meta["text_hash"]))
+        else:
+            seen_hashes.add(meta["text_hash"])
+
+    new_docs = []
+    for doc in batch:
+        text_hash = doc["metadata"]["text_hash"]
+        if text_hash in seen_hashes:
+            continue
+        seen_hashes.add(text_hash)
+        if (doc["id"], text_hash) in unchanged:
+            kept_ids.add(doc["id"])
+        else:
+            new_docs.append(doc)
+    return new_docs
+
+
 def add_pdf_to_vector_db(pdf_file_path, collection):
-    """将解析后的PDF文本向量化，存入Chroma向量库"""
-    # 1. 解析PDF
-    documents = parse_pdf(pdf_file_path)
-    if not documents:
+    """将解析后的PDF文本向量化，存入Chroma向量库（解析与编码流水线并行：编码当前批次时后台线程继续解析后续页）。
+    同名文献重新上传视为新版本：改动过的文本块覆盖写入，旧版本多出来的文本块被删除。
+    注意：与其他文献重复的文本块只存一份，若那份所属文献之后被更新删除，本文献中对应的文本也随之不在库中"""
+    # 1. 解析PDF（后台线程）+ 去重 + 批量编码（当前线程）；重复的文本块不再编码，重复上传几乎不耗时
+    file_name = os.path.basename(pdf_file_path)
+    documents = []
+    embeddings = []
+    pending = []  # 去重后等待编码的文本块，攒满一批再编码
+    parsed_count = 0
+    seen_hashes = set()
+    kept_ids = set()  # 库中已有且内容未变、无需重写的文本块ID
+    chunk_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    stop_event = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        producer = executor.submit(_produce_chunk_batches, pdf_file_path, chunk_queue, stop_event)
+        batch = []
+        try:
+            while (batch := chunk_queue.get()) is not None:
+                parsed_count += len(batch)
+                pending.extend(_drop_duplicate_chunks(batch, collection, seen_hashes, kept_ids))
+                while len(pending) >= PIPELINE_BATCH_SIZE:
+                    full_batch, pending = pending[:PIPELINE_BATCH_SIZE], pending[PIPELINE_BATCH_SIZE:]
+                    documents.extend(full_batch)
+                    embeddings.extend(embed_texts([doc["text"] for doc in full_batch]))
+            if pending:  # 最后不足一批的文本块
+                documents.extend(pending)
+                embeddings.extend(embed_texts([doc["text"] for doc in pending]))
+        finally:
+            stop_event.set()
+            while batch is not None:  # 异常退出时取空队列，避免生产者阻塞在put上
+                batch = chunk_queue.get()
+        producer.result()  # 解析出错时在这里抛出
+    if not parsed_count:
         return False, "PDF解析失败，未提取到文本"
 
-    # 2. 准备入库数据（Chroma需要的格式：ids、documents、metadatas）
-    ids = [f"{doc['metadata']['file_name']}_page{doc['metadata']['page_num']}" for doc in documents]
-    texts = [doc["text"] for doc in documents]
-    metadatas = [doc["metadata"] for doc in documents]
+    # 2. 写入新增/改动的文本块：用upsert，同名文献新版本中改动过的文本块会覆盖旧内容
+    if documents:
+        collection.upsert(
+            ids=[doc["id"] for doc in documents],
+            embeddings=embeddings,
+            documents=[doc["text"] for doc in documents],
+            metadatas=[doc["metadata"] for doc in documents]
+        )
+    kept_ids.update(doc["id"] for doc in documents)
 
-    # 3. 存入向量库
-    collection.add(
-        ids=ids,
-        documents=texts,
-        metadatas=metadatas
-    )
-    return True, f"成功入库！共{len(documents)}页文本"
+    # 3. 删除该文献旧版本中本次没有保留的文本块（页数/分块变少、或内容已与其他文献重复）
+    stale_ids = [doc_id for doc_id in collection.get(where={"file_name": file_name}, include=[])["ids"]
+                 if doc_id not in kept_ids]
+    if stale_ids:
+        collection.delete(ids=stale_ids)
+
+    if not documents and not stale_ids:
+        return True, "该文献内容已全部在向量库中，无需重复入库"
+    page_count = len({doc["metadata"]["page_num"] for doc in documents})
+    skipped_count = parsed_count - len(documents)
+    details = []
+    if skipped_count:
+        details.append(f"跳过{skipped_count}个已存在或重复的文本块")
+    if stale_ids:
+        details.append(f"删除{len(stale_ids)}个旧版本文本块")
+    details_msg = f"（{'，'.join(details)}）" if details else ""
+    return True, f"成功入库！写入{page_count}页文本，{len(documents)}个文本块{details_msg}"
 
 # -------------------------- 新增：多轮RAG检索（粗检索→精排→上下文补全） --------------------------
 def multi_stage_retrieval(query, collection, top_k_coarse=10, top_k_final=3):
@@ -76,68 +298,142 @@ def multi_stage_retrieval(query, collection, top_k_coarse=10, top_k_final=3):
     coarse_results = collection.query(
         query_texts=[query],
         n_results=top_k_coarse,
-        include=["documents", "metadatas", "distances"]  # 包含相似度分数
+        include=["documents", "metadatas", "distances", "embeddings"]  # 包含相似度分数和向量（供MMR去重）
     )
     coarse_docs = [
-        {"text": doc, "metadata": meta, "distance": dist}
-        for doc, meta, dist in zip(
+        {"id": doc_id, "text": doc, "metadata": meta, "distance": dist}
+        for doc_id, doc, meta, dist in zip(
+            coarse_results["ids"][0],
             coarse_results["documents"][0],
             coarse_results["metadatas"][0],
             coarse_results["distances"][0]
         )
     ]
 
-    # 2. 精排：用大模型对片段打分（0-10分，筛选≥6分的片段）
-    ranked_docs = []
-    for doc in coarse_docs:
-        score_prompt = f"""
-        请判断以下文献片段与用户问题的相关性，仅返回分数（0-10分，分数越高相关性越强），不要其他内容：
-        用户问题：{query}
-        文献片段：{doc['text'][:300]}...
-        相关性分数：
-        """
-        response = ollama.generate(
-            model="deepseek-r1:1.5b",
-            prompt=score_prompt,
-            options={"temperature": 0.1}
-        )
-        try:
-            score = float(response["response"].strip())
-            if score >= 6:
-                ranked_docs.append({"doc": doc, "score": score})
-        except:
-            continue  # 分数解析失败则跳过
+    if not coarse_docs:
+        return []
 
-    # 3. 按分数排序，取Top3
-    ranked_docs.sort(key=lambda x: x["score"], reverse=True)
-    final_docs = [item["doc"] for item in ranked_docs[:top_k_final]]
+    # 2. 精排：用交叉编码器一次前向为所有片段打分（打分结果有缓存）
+    scores = score_chunks(query, coarse_docs)
+
+    # 3. MMR选取Top3：兼顾精排分数与片段多样性（重叠文本块、内容相近的页只保留一个）
+    selected = mmr_select(scores, coarse_results["embeddings"][0], top_k_final)
+    final_docs = [coarse_docs[idx] for idx in selected]
 
     # 4. 上下文补全：补充相邻页码文本（若存在）
     final_docs_with_context = complete_adjacent_pages(final_docs, collection)
     return final_docs_with_context
 
 
+# 精排模型：专用交叉编码器（ONNX Runtime推理），比逐个调用大模型打分快得多
+RERANKER_MODEL_NAME = "BAAI/bge-reranker-v2-m3"
+# 该模型只发布了PyTorch权重：首次使用时导出一次ONNX（约568M参数，需数分钟、数GB内存），之后直接加载本地导出结果
+RERANKER_ONNX_DIR = "./models/bge-reranker-v2-m3-onnx"
+_reranker_export_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def get_reranker():
+    """加载精排模型（首次调用时加载，之后复用）；本地还没有导出好的ONNX模型时先导出并保存"""
+    model_kwargs = {"session_options": ort_session_options()}
+    with _reranker_export_lock:
+        if os.path.isdir(RERANKER_ONNX_DIR):
+            return CrossEncoder(RERANKER_ONNX_DIR, backend="onnx", max_length=512, model_kwargs=model_kwargs)
+
+        reranker = CrossEncoder(RERANKER_MODEL_NAME, backend="onnx", max_length=512, model_kwargs=model_kwargs)
+        # 先写到临时目录再改名，导出中途中断不会留下不完整的模型目录
+        tmp_dir = f"{RERANKER_ONNX_DIR}.tmp"
+        reranker.save_pretrained(tmp_dir)
+        os.replace(tmp_dir, RERANKER_ONNX_DIR)
+        return reranker
+
+
+# 精排打分缓存：键为（问题, 片段ID, 片段文本），超出容量时淘汰最久未使用的记录
+RERANK_CACHE_SIZE = 50_000
+_rerank_cache = OrderedDict()
+_rerank_cache_lock = threading.Lock()
+
+
+def score_chunks(query, docs):
+    """用交叉编码器为多个片段打分（分数越高相关性越强），未缓存的片段在一次前向中批量计算"""
+    keys = [(query, doc["id"], doc["text"]) for doc in docs]  # 整块交给模型，长度由max_length按token截断
+    scores = [None] * len(docs)
+    missing = []
+    with _rerank_cache_lock:
+        for idx, key in enumerate(keys):
+            if key in _rerank_cache:
+                _rerank_cache.move_to_end(key)
+                scores[idx] = _rerank_cache[key]
+            else:
+                missing.append(idx)
+    if not missing:
+        return scores
+
+    new_scores = get_reranker().predict([(query, keys[idx][2]) for idx in missing])
+
+    with _rerank_cache_lock:
+        for idx, score in zip(missing, new_scores):
+            scores[idx] = float(score)
+            _rerank_cache[keys[idx]] = scores[idx]
+        while len(_rerank_cache) > RERANK_CACHE_SIZE:
+            _rerank_cache.popitem(last=False)
+    return scores
+
+
+MMR_LAMBDA = 0.7  # MMR中相关性的权重，越小越强调多样性
+
+
+def mmr_select(relevance, doc_embeddings, top_k, lambda_mult=MMR_LAMBDA):
+    """最大边际相关性（MMR）：依次选出“相关性高且与已选片段不重复”的片段，返回其下标"""
+    relevance = np.asarray(relevance, dtype=np.float32)
+    embeddings = np.asarray(doc_embeddings, dtype=np.float32)
+    embeddings = embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-12)
+    similarity = embeddings @ embeddings.T  # 片段两两余弦相似度，只计算一次
+
+    selected = []
+    redundancy = np.zeros(len(relevance), dtype=np.float32)  # 各片段与已选片段的最大相似度
+    remaining = np.ones(len(relevance), dtype=bool)
+    for _ in range(min(top_k, len(relevance))):
+        mmr_scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        mmr_scores[~remaining] = -np.inf
+        best = int(np.argmax(mmr_scores))
+        selected.append(best)
+        remaining[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return selected
+
+
 def complete_adjacent_pages(selected_docs, collection):
-    """补全选中片段的相邻页码文本（避免信息断裂）—— 辅助多轮检索函数"""
+    """补全选中片段的相邻页码文本（避免信息断裂）—— 辅助多轮检索函数
+    取相邻页中块序号最小的文本块：首块可能因与其他文献重复而未单独存储；整页都重复时该页无法补充"""
+    # 所有片段的前1页和后1页，按文件名+页码一次性从向量库取回
+    adjacent = [
+        [
+            (doc["metadata"]["file_name"], page_num)
+            for page_num in (doc["metadata"]["page_num"] - 1, doc["metadata"]["page_num"] + 1)
+            if page_num >= 1
+        ]
+        for doc in selected_docs
+    ]
+    targets = list(dict.fromkeys(target for doc_targets in adjacent for target in doc_targets))  # 去重
+    if not targets:
+        return list(selected_docs)
+    conditions = [{"$and": [{"file_name": file_name}, {"page_num": page_num}]} for file_name, page_num in targets]
+    where = conditions[0] if len(conditions) == 1 else {"$or": conditions}
+    fetched = collection.get(where=where, include=["documents", "metadatas"])
+
+    first_chunks = {}  # (文件名, 页码) -> (块序号, 文本)
+    for meta, text in zip(fetched["metadatas"], fetched["documents"]):
+        key = (meta["file_name"], meta["page_num"])
+        chunk_id = meta.get("chunk_id", 0)
+        if key not in first_chunks or chunk_id < first_chunks[key][0]:
+            first_chunks[key] = (chunk_id, text)
+
     completed_docs = []
-    # 先获取所有文献的元数据和文本，用于内存筛选
-    all_docs = collection.get(include=["documents", "metadatas"])
-    all_metadatas = all_docs["metadatas"]
-    all_documents = all_docs["documents"]
-
-    for doc in selected_docs:
-        file_name = doc["metadata"]["file_name"]
-        current_page = doc["metadata"]["page_num"]
-        # 查找前1页和后1页的文献
-        for offset in [-1, 1]:
-            target_page = current_page + offset
-            if target_page < 1:
-                continue
-            # 内存中筛选符合文件名和目标页码的文献
-            for meta, text in zip(all_metadatas, all_documents):
-                if meta.get("file_name") == file_name and meta.get("page_num") == target_page:
-                    doc["text"] += f"\n\n【补充上下文（第{target_page}页）】：{text[:200]}..."
-                    break  # 找到后跳出循环
+    for doc, doc_targets in zip(selected_docs, adjacent):
+        for target in doc_targets:
+            if target in first_chunks:
+                doc["text"] += f"\n\n【补充上下文（第{target[1]}页）】：{first_chunks[target][1][:200]}..."
         completed_docs.append(doc)
     return completed_docs
 
@@ -160,13 +456,13 @@ def complete_adjacent_pages(selected_docs, collection):
 
 # -------------------------- 新增：清空向量库功能 --------------------------
 def clear_vector_db(collection):
-    """清空向量库中所有文献数据（保留集合结构，可重新入库）"""
+    """清空向量库中所有文献数据：删除整个集合并按当前HNSW参数重建（之前持有的集合对象随之失效，需重新init_vector_db）"""
     try:
-        # 获取向量库中所有文档的ID
-        all_ids = collection.get()["ids"]
-        if all_ids:  # 若存在数据则删除
-            collection.delete(ids=all_ids)
-            return True, f"成功清空向量库！共删除{len(all_ids)}条数据"
+        doc_count = collection.count()
+        if doc_count:  # 若存在数据则删除
+            chromadb.PersistentClient(path=CHROMA_DB_PATH).delete_collection(COLLECTION_NAME)
+            init_vector_db()
+            return True, f"成功清空向量库！共删除{doc_count}条数据"
         else:
             return True, "向量库已为空，无需清空"
     except Exception as e: